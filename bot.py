@@ -1,15 +1,33 @@
-import json
 import os
 import asyncio
+import functools
 import logging
-from datetime import datetime, timedelta, time
-from typing import Dict, List, Optional
+import re
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from datetime import date, datetime, timedelta, time
+from typing import Dict, List, Optional, Set
+import aiosqlite
 import apprise
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from cachetools import TTLCache
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 import pytz
 from dotenv import load_dotenv
 
+# Use uvloop for the asyncio event loop when available
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 # Load environment variables
 load_dotenv()
 
@@ -19,32 +37,308 @@ logging.basicConfig(
     level=logging.INFO
 )
 logger = logging.getLogger(__name__)
+# APScheduler logs every added and executed job at INFO
+logging.getLogger('apscheduler').setLevel(logging.WARNING)
+
+# One keep-alive connection pool for all of Apprise's HTTP(S) requests
+_http_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=2, backoff_factor=0.2)
+)
+_http_local = threading.local()
+
+def _http_session() -> requests.Session:
+    """Get this thread's session; Sessions aren't thread-safe, but they share one pool"""
+    session = getattr(_http_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        # Endpoints of different users may share a host, so never carry cookies between them
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        session.mount('https://', _http_adapter)
+        session.mount('http://', _http_adapter)
+        _http_local.session = session
+    return session
+
+def _pooled_request(method, url, **kwargs):
+    """Drop-in for requests.request that reuses pooled connections"""
+    return _http_session().request(method=method, url=url, **kwargs)
+
+# Deliberately process-wide: Apprise plugins call requests.post()/get()/request()
+# directly, each of which opens a throwaway Session and a fresh TLS connection
+requests.api.request = _pooled_request
+requests.request = _pooled_request
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    timezone TEXT NOT NULL DEFAULT 'UTC'
+);
+CREATE TABLE IF NOT EXISTS birthdays (
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    month INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    PRIMARY KEY (user_id, name)
+);
+CREATE TABLE IF NOT EXISTS endpoints (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    url TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_endpoints_user ON endpoints (user_id);
+CREATE TABLE IF NOT EXISTS reminders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reminders_user ON reminders (user_id);
+"""
+
+# PRAGMA user_version once birthdays.json has been imported (or found unnecessary)
+LEGACY_IMPORTED_VERSION = 1
+
+# Maximum number of notification endpoints per user, including the Telegram one
+MAX_ENDPOINTS = 25
+
+@functools.lru_cache(maxsize=512)
+def _tz(name: str):
+    """Get a pytz timezone, cached since pytz lookups are slow"""
+    return pytz.timezone(name)
+
+def _parse_birthday(value) -> Dict:
+    """Parse a birthday into {'m': month, 'd': day}, accepting the old MM-DD string format"""
+    if isinstance(value, str):
+        month, day = value.split('-')
+        return {'m': int(month), 'd': int(day)}
+    return {'m': int(value['m']), 'd': int(value['d'])}
+
+def _format_birthday(birthday: Dict) -> str:
+    """Format a parsed birthday as MM-DD"""
+    return f"{birthday['m']:02d}-{birthday['d']:02d}"
+
+_MAIL_RE = re.compile(r'^mailto://.*@([^@]*)$')
+
+def _truncate_endpoint(endpoint: str) -> str:
+    """Shorten an endpoint for display"""
+    return endpoint[:20] + "..." if len(endpoint) > 20 else endpoint
+
+def _mask_mailto(endpoint: str) -> str:
+    """Mask everything before the mail host"""
+    match = _MAIL_RE.match(endpoint)
+    return f"mailto://***@{match.group(1)}" if match else _truncate_endpoint(endpoint)
 
 class BirthdayBot:
+    # Endpoint prefixes with their display masking functions
+    _MASK_PREFIXES = (
+        ('mailto://', _mask_mailto),
+        ('tgram://', lambda endpoint: "tgram://*** (Telegram)"),
+        ('discord://', lambda endpoint: "discord://*** (Discord Webhook)"),
+    )
+    
     def __init__(self, token: str):
         self.token = token
-        self.data_file = 'birthdays.json'
-        self.users_data = self.load_data()
-        self.pending_endpoints = {}  # Store pending endpoints for confirmation
-        self.sent_reminders = set()  # Track sent reminders to prevent duplicates
+        self.db_file = 'data/birthdays.db'
+        self.legacy_data_file = 'birthdays.json'  # Imported once into a new database
+        self.db = None  # Opened in post_init
+        self.users_data = {}  # In-memory copy of the database, loaded in post_init
+        # Store pending endpoints for confirmation, dropping unconfirmed ones after 10 minutes
+        self.pending_endpoints = TTLCache(maxsize=10_000, ttl=600)
+        self._apprise_cache: Dict[str, List[apprise.Apprise]] = {}  # Per-user, one Apprise per endpoint
+        self.scheduler = None  # Created in post_init once the event loop is running
+        self._user_jobs: Dict[str, Set[str]] = {}  # Scheduled job ids per user
         self.application = Application.builder().token(token).build()
         self.setup_handlers()
         
-    def load_data(self) -> Dict:
-        """Load user data from JSON file"""
-        if os.path.exists(self.data_file):
+    async def init_db(self):
+        """Open the SQLite database, creating tables and importing legacy JSON data once"""
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        self.db = await aiosqlite.connect(self.db_file)
+        
+        try:
+            await self.db.execute("PRAGMA journal_mode=WAL")
+            await self.db.execute("PRAGMA synchronous=NORMAL")
+            await self.db.executescript(SCHEMA)
+            
+            # user_version marks that the legacy import has been done; the import
+            # and the marker are committed together so a failed import is retried
+            await self.db.execute("BEGIN")
+            async with self.db.execute("PRAGMA user_version") as cursor:
+                (version,) = await cursor.fetchone()
+            if version < LEGACY_IMPORTED_VERSION:
+                # Databases created before the marker existed already hold their data
+                if await self.db_is_empty():
+                    await self.import_legacy_data()
+                await self.db.execute(f"PRAGMA user_version = {LEGACY_IMPORTED_VERSION}")
+            await self.db.commit()
+        except Exception:
+            # Closing rolls back the open transaction and stops the worker thread
+            await self.db.close()
+            raise
+    
+    async def db_is_empty(self) -> bool:
+        """Check whether the database holds no user data at all"""
+        async with self.db.execute(
+            "SELECT EXISTS (SELECT 1 FROM users) OR EXISTS (SELECT 1 FROM birthdays) "
+            "OR EXISTS (SELECT 1 FROM endpoints) OR EXISTS (SELECT 1 FROM reminders)"
+        ) as cursor:
+            (has_data,) = await cursor.fetchone()
+        return not has_data
+    
+    def load_legacy_data(self) -> Dict:
+        """Load user data from the JSON file used by older versions"""
+        try:
+            with open(self.legacy_data_file, 'rb') as f:
+                legacy_data = orjson.loads(f.read())
+        except OSError:
+            return {}
+        except orjson.JSONDecodeError:
+            logger.error("Error reading JSON file, skipping import")
+            return {}
+        
+        if not isinstance(legacy_data, dict):
+            logger.error("Unexpected JSON file contents, skipping import")
+            return {}
+        return legacy_data
+    
+    async def import_legacy_data(self):
+        """Copy user data from the legacy JSON file into the database, skipping invalid entries"""
+        legacy_data = self.load_legacy_data()
+        imported = 0
+        
+        for user_id, user_data in legacy_data.items():
+            if not isinstance(user_data, dict):
+                logger.error("Skipping invalid legacy user %s", user_id)
+                continue
+            
+            timezone = user_data.get('timezone', 'UTC')
             try:
-                with open(self.data_file, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                logger.error("Error reading JSON file, starting with empty data")
-                return {}
-        return {}
-    
-    def save_data(self):
-        """Save user data to JSON file"""
-        with open(self.data_file, 'w') as f:
-            json.dump(self.users_data, f, indent=2, default=str)
+                _tz(timezone)
+            except (pytz.exceptions.UnknownTimeZoneError, AttributeError):
+                logger.error("Invalid timezone %s for user %s, using UTC", timezone, user_id)
+                timezone = 'UTC'
+            
+            birthdays = []
+            for name, value in user_data.get('birthdays', {}).items():
+                try:
+                    birthday = _parse_birthday(value)
+                    datetime.strptime(_format_birthday(birthday), '%m-%d')  # Same check as /add_birthday
+                except (ValueError, TypeError, KeyError, AttributeError) as e:
+                    logger.error("Skipping invalid birthday %s for user %s: %s", name, user_id, e)
+                    continue
+                birthdays.append((user_id, name, birthday['m'], birthday['d']))
+            
+            endpoints = []
+            for url in user_data.get('apprise_endpoints', []):
+                if not isinstance(url, str):
+                    logger.error("Skipping invalid endpoint for user %s", user_id)
+                    continue
+                endpoints.append((user_id, url))
+            
+            # Reminder values are validated when loaded, see load_data
+            reminders = []
+            for reminder in user_data.get('reminders', []):
+                try:
+                    reminders.append((user_id, str(reminder['type']), str(reminder['value'])))
+                except (TypeError, KeyError) as e:
+                    logger.error("Skipping invalid reminder for user %s: %s", user_id, e)
+            
+            await self.db.execute(
+                "INSERT INTO users (user_id, timezone) VALUES (?, ?)", (str(user_id), timezone)
+            )
+            await self.db.executemany(
+                "INSERT INTO birthdays (user_id, name, month, day) VALUES (?, ?, ?, ?)", birthdays
+            )
+            await self.db.executemany(
+                "INSERT INTO endpoints (user_id, url) VALUES (?, ?)", endpoints
+            )
+            await self.db.executemany(
+                "INSERT INTO reminders (user_id, type, value) VALUES (?, ?, ?)", reminders
+            )
+            imported += 1
+        
+        if imported:
+            logger.info("Imported data for %s users from %s", imported, self.legacy_data_file)
+    
+    async def load_data(self):
+        """Load all user data from the database into memory"""
+        self.users_data = {}
+        
+        async with self.db.execute("SELECT user_id, timezone FROM users") as cursor:
+            async for user_id, timezone in cursor:
+                self.get_user_data(user_id)['timezone'] = timezone
+        
+        async with self.db.execute("SELECT user_id, name, month, day FROM birthdays") as cursor:
+            async for user_id, name, month, day in cursor:
+                self.get_user_data(user_id)['birthdays'][name] = {'m': month, 'd': day}
+        
+        async with self.db.execute("SELECT user_id, url FROM endpoints ORDER BY id") as cursor:
+            async for user_id, url in cursor:
+                self.get_user_data(user_id)['apprise_endpoints'].append(url)
+        
+        async with self.db.execute("SELECT id, user_id, type, value FROM reminders ORDER BY id") as cursor:
+            async for reminder_id, user_id, reminder_type, value in cursor:
+                try:
+                    reminder = self.parse_reminder(reminder_type, value)
+                except ValueError as e:
+                    logger.error("Skipping invalid reminder %s: %s", reminder_id, e)
+                    continue
+                reminder['id'] = reminder_id
+                self.get_user_data(user_id)['reminders'].append(reminder)
+    
+    async def _execute(self, sql: str, parameters: tuple = ()) -> aiosqlite.Cursor:
+        """Execute and commit a single write statement"""
+        cursor = await self.db.execute(sql, parameters)
+        await self.db.commit()
+        return cursor
+    
+    async def db_save_birthday(self, user_id: str, name: str, birthday: Dict):
+        """Insert or update a birthday row"""
+        await self._execute(
+            "INSERT OR REPLACE INTO birthdays (user_id, name, month, day) VALUES (?, ?, ?, ?)",
+            (user_id, name, birthday['m'], birthday['d'])
+        )
+    
+    async def db_delete_birthday(self, user_id: str, name: str):
+        """Delete a birthday row"""
+        await self._execute(
+            "DELETE FROM birthdays WHERE user_id = ? AND name = ?", (user_id, name)
+        )
+    
+    async def db_add_endpoint(self, user_id: str, url: str):
+        """Insert an endpoint row"""
+        await self._execute(
+            "INSERT INTO endpoints (user_id, url) VALUES (?, ?)", (user_id, url)
+        )
+    
+    async def db_delete_endpoint(self, user_id: str, url: str):
+        """Delete one endpoint row matching the URL"""
+        await self._execute(
+            "DELETE FROM endpoints WHERE id = "
+            "(SELECT id FROM endpoints WHERE user_id = ? AND url = ? ORDER BY id LIMIT 1)",
+            (user_id, url)
+        )
+    
+    async def db_add_reminder(self, user_id: str, reminder: Dict):
+        """Insert a reminder row and record its id on the reminder"""
+        cursor = await self._execute(
+            "INSERT INTO reminders (user_id, type, value) VALUES (?, ?, ?)",
+            (user_id, reminder['type'], reminder['value'])
+        )
+        reminder['id'] = cursor.lastrowid
+    
+    async def db_delete_reminder(self, reminder: Dict):
+        """Delete a reminder row"""
+        await self._execute("DELETE FROM reminders WHERE id = ?", (reminder['id'],))
+    
+    async def db_set_timezone(self, user_id: str, timezone: str):
+        """Insert or update a user's timezone"""
+        await self._execute(
+            "INSERT INTO users (user_id, timezone) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET timezone = excluded.timezone",
+            (user_id, timezone)
+        )
     
     def get_user_data(self, user_id: str) -> Dict:
         """Get or create user data"""
@@ -57,53 +351,35 @@ class BirthdayBot:
             }
         return self.users_data[user_id]
     
-    def create_reminder_key(self, user_id: str, name: str, birthday_str: str, reminder: Dict, reminder_time: datetime) -> str:
-        """Create a unique key for tracking sent reminders"""
-        # Round reminder time to the minute to avoid sub-minute duplicates
-        rounded_time = reminder_time.replace(second=0, microsecond=0)
-        return f"{user_id}_{name}_{birthday_str}_{reminder['type']}_{reminder['value']}_{rounded_time.isoformat()}"
-    
-    def cleanup_old_reminder_keys(self):
-        """Clean up reminder keys older than 24 hours to prevent memory buildup"""
-        current_time = datetime.now(pytz.UTC)
-        keys_to_remove = []
-        
-        for key in self.sent_reminders:
-            try:
-                # Extract timestamp from the key (last part after splitting by '_')
-                timestamp_str = key.split('_')[-1]
-                key_time = datetime.fromisoformat(timestamp_str)
-                
-                # Remove keys older than 24 hours
-                if (current_time - key_time).total_seconds() > 86400:  # 24 hours
-                    keys_to_remove.append(key)
-            except (ValueError, IndexError):
-                # If we can't parse the timestamp, remove the key to be safe
-                keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            self.sent_reminders.discard(key)
-    
     def setup_handlers(self):
         """Setup command and message handlers"""
-        # Command handlers
-        self.application.add_handler(CommandHandler("start", self.start))
-        self.application.add_handler(CommandHandler("help", self.help_command))
-        self.application.add_handler(CommandHandler("add_birthday", self.add_birthday))
-        self.application.add_handler(CommandHandler("list_birthdays", self.list_birthdays))
-        self.application.add_handler(CommandHandler("remove_birthday", self.remove_birthday))
-        self.application.add_handler(CommandHandler("add_endpoint", self.add_endpoint))
-        self.application.add_handler(CommandHandler("list_endpoints", self.list_endpoints))
-        self.application.add_handler(CommandHandler("remove_endpoint", self.remove_endpoint))
-        self.application.add_handler(CommandHandler("add_reminder", self.add_reminder))
-        self.application.add_handler(CommandHandler("list_reminders", self.list_reminders))
-        self.application.add_handler(CommandHandler("remove_reminder", self.remove_reminder))
-        self.application.add_handler(CommandHandler("set_timezone", self.set_timezone))
-        self.application.add_handler(CommandHandler("test_notifications", self.test_notifications))
+        # Command name -> handler, dispatched from a single CommandHandler
+        self._cmds = {
+            "start": self.start,
+            "help": self.help_command,
+            "add_birthday": self.add_birthday,
+            "list_birthdays": self.list_birthdays,
+            "remove_birthday": self.remove_birthday,
+            "add_endpoint": self.add_endpoint,
+            "list_endpoints": self.list_endpoints,
+            "remove_endpoint": self.remove_endpoint,
+            "add_reminder": self.add_reminder,
+            "list_reminders": self.list_reminders,
+            "remove_reminder": self.remove_reminder,
+            "set_timezone": self.set_timezone,
+            "test_notifications": self.test_notifications,
+        }
+        self.application.add_handler(CommandHandler(list(self._cmds), self.dispatch_command))
         
         # Callback query handler for inline keyboards
         self.application.add_handler(CallbackQueryHandler(self.handle_callback))
     
+    async def dispatch_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Route a command to its handler"""
+        # "/Command@BotName args" -> "command"; CommandHandler matches case-insensitively
+        command = update.effective_message.text.split()[0][1:].split('@')[0].lower()
+        await self._cmds[command](update, context)
+    
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start command handler"""
         welcome_message = """
@@ -168,8 +444,10 @@ Examples:
         try:
             # Validate date format
             datetime.strptime(date_str, '%m-%d')
-            user_data['birthdays'][name] = date_str
-            self.save_data()
+            birthday = _parse_birthday(date_str)
+            user_data['birthdays'][name] = birthday
+            await self.db_save_birthday(user_id, name, birthday)
+            self.schedule_user_reminders(user_id)
             
             await update.message.reply_text(f"✅ Birthday added: {name} on {date_str}")
         except ValueError:
@@ -184,13 +462,14 @@ Examples:
             await update.message.reply_text("📅 No birthdays stored yet.")
             return
         
-        message = "📅 **Your Birthdays:**\n\n"
-        for name, date in user_data['birthdays'].items():
-            next_birthday = self.get_next_birthday_date(date)
-            days_until = (next_birthday - datetime.now().date()).days
-            message += f"• {name}: {date} ({days_until} days until next birthday)\n"
+        today = datetime.now(_tz(user_data.get('timezone', 'UTC'))).date()
+        parts = ["📅 **Your Birthdays:**", ""]
+        for name, birthday in user_data['birthdays'].items():
+            next_birthday = self.get_next_birthday_date(birthday, today)
+            days_until = (next_birthday - today).days
+            parts.append(f"• {name}: {_format_birthday(birthday)} ({days_until} days until next birthday)")
         
-        await update.message.reply_text(message, parse_mode='Markdown')
+        await update.message.reply_text("\n".join(parts), parse_mode='Markdown')
     
     async def remove_birthday(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Remove birthday command handler"""
@@ -204,7 +483,8 @@ Examples:
         name = context.args[0]
         if name in user_data['birthdays']:
             del user_data['birthdays'][name]
-            self.save_data()
+            await self.db_delete_birthday(user_id, name)
+            self.schedule_user_reminders(user_id)
             await update.message.reply_text(f"✅ Removed birthday for {name}")
         else:
             await update.message.reply_text(f"❌ No birthday found for {name}")
@@ -223,6 +503,12 @@ Examples:
         
         endpoint = ' '.join(context.args)
         
+        telegram_endpoint = f"tgram://{self.token}/{update.message.chat.id}"
+        error = self.check_new_endpoint(user_data, endpoint, telegram_endpoint)
+        if error:
+            await update.message.reply_text(error)
+            return
+        
         # Test the endpoint first
         apobj = apprise.Apprise()
         if not apobj.add(endpoint):
@@ -234,7 +520,7 @@ Examples:
         test_message = "This is a test notification to verify your endpoint is working correctly. Please confirm if you received this message."
         
         try:
-            success = apobj.notify(body=test_message, title=test_title)
+            success = await asyncio.to_thread(apobj.notify, body=test_message, title=test_title)
             if not success:
                 await update.message.reply_text("❌ Failed to send test notification to this endpoint")
                 return
@@ -270,26 +556,32 @@ Examples:
             await update.message.reply_text("📡 No notification endpoints configured.")
             return
         
-        message = "📡 **Notification Endpoints:**\n\n"
+        parts = ["📡 **Notification Endpoints:**", ""]
         for i, endpoint in enumerate(user_data['apprise_endpoints'], 1):
             # Hide sensitive information in display
             display_endpoint = self.mask_sensitive_info(endpoint)
-            message += f"{i}. {display_endpoint}\n"
+            parts.append(f"{i}. {display_endpoint}")
         
-        await update.message.reply_text(message, parse_mode='Markdown')
+        await update.message.reply_text("\n".join(parts), parse_mode='Markdown')
+    
+    def check_new_endpoint(self, user_data: Dict, endpoint: str, telegram_endpoint: str) -> Optional[str]:
+        """Return an error message if the endpoint is a duplicate or would exceed the endpoint limit"""
+        endpoints = user_data['apprise_endpoints']
+        if endpoint in endpoints:
+            return "❌ This endpoint is already configured"
+        
+        # Adding an endpoint also adds the Telegram endpoint if it is missing
+        new_endpoints = {endpoint, telegram_endpoint}.difference(endpoints)
+        if len(endpoints) + len(new_endpoints) > MAX_ENDPOINTS:
+            return f"❌ You can have at most {MAX_ENDPOINTS} notification endpoints"
+        return None
     
     def mask_sensitive_info(self, endpoint: str) -> str:
         """Mask sensitive information in endpoints for display"""
-        # Basic masking for common patterns
-        if 'mailto://' in endpoint:
-            parts = endpoint.split('@')
-            if len(parts) > 1:
-                return f"mailto://***@{parts[-1]}"
-        elif 'tgram://' in endpoint:
-            return "tgram://*** (Telegram)"
-        elif 'discord://' in endpoint:
-            return "discord://*** (Discord Webhook)"
-        return endpoint[:20] + "..." if len(endpoint) > 20 else endpoint
+        for prefix, mask in self._MASK_PREFIXES:
+            if endpoint.startswith(prefix):
+                return mask(endpoint)
+        return _truncate_endpoint(endpoint)
     
     async def remove_endpoint(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Remove notification endpoint"""
@@ -335,36 +627,40 @@ Examples:
         reminder_type = context.args[0]
         value = context.args[1]
         
-        reminder = {'type': reminder_type, 'value': value}
-        
         try:
-            # Validate reminder format
-            self.validate_reminder(reminder)
+            reminder = self.parse_reminder(reminder_type, value)
             user_data['reminders'].append(reminder)
-            self.save_data()
+            await self.db_add_reminder(user_id, reminder)
+            self.schedule_user_reminders(user_id)
             
             await update.message.reply_text(f"✅ Reminder added: {reminder_type} = {value}")
         except ValueError as e:
             await update.message.reply_text(f"❌ Invalid reminder format: {str(e)}")
     
-    def validate_reminder(self, reminder: Dict):
-        """Validate reminder format"""
-        reminder_type = reminder['type']
-        value = reminder['value']
-        
-        if reminder_type in ['minutes_before', 'hours_before', 'days_before']:
-            int(value)  # Will raise ValueError if not a valid integer
+    def parse_reminder(self, reminder_type: str, value: str) -> Dict:
+        """Validate a reminder and parse it into its offset in minutes from the start of the birthday"""
+        if reminder_type == 'minutes_before':
+            offset = -int(value)  # Will raise ValueError if not a valid integer
+        elif reminder_type == 'hours_before':
+            offset = -int(value) * 60
+        elif reminder_type == 'days_before':
+            offset = -int(value) * 1440 + 9 * 60  # 09:00 on that day
         elif reminder_type == 'time_on_day':
-            datetime.strptime(value, '%H:%M')  # Will raise ValueError if not HH:MM
+            reminder_time = datetime.strptime(value, '%H:%M')  # Will raise ValueError if not HH:MM
+            offset = reminder_time.hour * 60 + reminder_time.minute
         elif reminder_type == 'time_before':
             # Format: D:HH:MM (days:hours:minutes)
             parts = value.split(':')
             if len(parts) != 3:
                 raise ValueError("time_before format should be D:HH:MM")
-            int(parts[0])  # days
-            datetime.strptime(f"{parts[1]}:{parts[2]}", '%H:%M')  # time
+            days = int(parts[0])
+            reminder_time = datetime.strptime(f"{parts[1]}:{parts[2]}", '%H:%M')
+            offset = -days * 1440 + reminder_time.hour * 60 + reminder_time.minute
         else:
             raise ValueError(f"Unknown reminder type: {reminder_type}")
+        
+        # type and value are kept for display and storage
+        return {'type': reminder_type, 'value': value, 'offset': offset}
     
     async def list_reminders(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """List all reminders"""
@@ -375,11 +671,11 @@ Examples:
             await update.message.reply_text("⏰ No reminders configured.")
             return
         
-        message = "⏰ **Your Reminders:**\n\n"
+        parts = ["⏰ **Your Reminders:**", ""]
         for i, reminder in enumerate(user_data['reminders'], 1):
-            message += f"{i}. {reminder['type']}: {reminder['value']}\n"
+            parts.append(f"{i}. {reminder['type']}: {reminder['value']}")
         
-        await update.message.reply_text(message, parse_mode='Markdown')
+        await update.message.reply_text("\n".join(parts), parse_mode='Markdown')
     
     async def remove_reminder(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Remove reminder"""
@@ -394,7 +690,8 @@ Examples:
             index = int(context.args[0]) - 1
             if 0 <= index < len(user_data['reminders']):
                 removed = user_data['reminders'].pop(index)
-                self.save_data()
+                await self.db_delete_reminder(removed)
+                self.schedule_user_reminders(user_id)
                 await update.message.reply_text(
                     f"✅ Removed reminder: {removed['type']} = {removed['value']}"
                 )
@@ -418,9 +715,10 @@ Examples:
         
         timezone = context.args[0]
         try:
-            pytz.timezone(timezone)  # Validate timezone
+            _tz(timezone)  # Validate timezone
             user_data['timezone'] = timezone
-            self.save_data()
+            await self.db_set_timezone(user_id, timezone)
+            self.schedule_user_reminders(user_id)
             await update.message.reply_text(f"✅ Timezone set to {timezone}")
         except pytz.exceptions.UnknownTimeZoneError:
             await update.message.reply_text("❌ Invalid timezone")
@@ -458,7 +756,8 @@ Examples:
             
             if 0 <= index < len(user_data['apprise_endpoints']):
                 removed = user_data['apprise_endpoints'].pop(index)
-                self.save_data()
+                self._apprise_cache.pop(user_id, None)
+                await self.db_delete_endpoint(user_id, removed)
                 await query.edit_message_text(
                     f"✅ Removed endpoint: {self.mask_sensitive_info(removed)}"
                 )
@@ -466,20 +765,28 @@ Examples:
                 await query.edit_message_text("❌ Invalid endpoint selection")
         
         elif query.data == "confirm_endpoint_yes":
-            # User confirmed they received the test notification
-            if user_id in self.pending_endpoints:
-                endpoint = self.pending_endpoints[user_id]
+            # User confirmed they received the test notification; take the pending
+            # endpoint once since TTLCache entries can expire between accesses
+            endpoint = self.pending_endpoints.pop(user_id, None)
+            if endpoint is not None:
                 user_data = self.get_user_data(user_id)
+                telegram_endpoint = f"tgram://{self.token}/{query.message.chat.id}"
+                
+                # Endpoints may have changed since the test notification was sent
+                error = self.check_new_endpoint(user_data, endpoint, telegram_endpoint)
+                if error:
+                    await query.edit_message_text(error)
+                    return
                 
                 user_data['apprise_endpoints'].append(endpoint)
+                await self.db_add_endpoint(user_id, endpoint)
                 
                 # Always ensure telegram endpoint is included
-                telegram_endpoint = f"tgram://{self.token}/{query.message.chat.id}"
                 if telegram_endpoint not in user_data['apprise_endpoints']:
                     user_data['apprise_endpoints'].append(telegram_endpoint)
+                    await self.db_add_endpoint(user_id, telegram_endpoint)
                 
-                self.save_data()
-                del self.pending_endpoints[user_id]
+                self._apprise_cache.pop(user_id, None)
                 
                 await query.edit_message_text(
                     f"✅ Endpoint added successfully!\n"
@@ -491,10 +798,8 @@ Examples:
         
         elif query.data == "confirm_endpoint_no":
             # User didn't receive the test notification
-            if user_id in self.pending_endpoints:
-                endpoint = self.pending_endpoints[user_id]
-                del self.pending_endpoints[user_id]
-                
+            endpoint = self.pending_endpoints.pop(user_id, None)
+            if endpoint is not None:
                 await query.edit_message_text(
                     f"❌ Endpoint not added due to failed test:\n"
                     f"📡 {self.mask_sensitive_info(endpoint)}\n\n"
@@ -504,139 +809,187 @@ Examples:
             else:
                 await query.edit_message_text("❌ No pending endpoint to cancel")
     
-    def get_next_birthday_date(self, birthday_str: str) -> datetime.date:
-        """Get next occurrence of birthday"""
-        current_year = datetime.now().year
-        month, day = map(int, birthday_str.split('-'))
-        
-        next_birthday = datetime(current_year, month, day).date()
+    def get_next_birthday_date(self, birthday: Dict, today: date) -> date:
+        """Get next occurrence of birthday on or after today"""
+        next_birthday = date(today.year, birthday['m'], birthday['d'])
         
         # If birthday already passed this year, use next year
-        if next_birthday < datetime.now().date():
-            next_birthday = datetime(current_year + 1, month, day).date()
+        if next_birthday < today:
+            next_birthday = date(today.year + 1, birthday['m'], birthday['d'])
         
         return next_birthday
     
-    def calculate_reminder_time(self, birthday_date: datetime.date, reminder: Dict, timezone_str: str) -> datetime:
+    def calculate_reminder_time(self, birthday_date: date, reminder: Dict, tz) -> datetime:
         """Calculate when to send reminder based on birthday and reminder settings"""
-        tz = pytz.timezone(timezone_str)
-        
-        reminder_type = reminder['type']
-        value = reminder['value']
-        
-        if reminder_type == 'minutes_before':
-            reminder_datetime = datetime.combine(birthday_date, time(0, 0))
-            reminder_datetime -= timedelta(minutes=int(value))
-        elif reminder_type == 'hours_before':
-            reminder_datetime = datetime.combine(birthday_date, time(0, 0))
-            reminder_datetime -= timedelta(hours=int(value))
-        elif reminder_type == 'days_before':
-            reminder_datetime = datetime.combine(birthday_date - timedelta(days=int(value)), time(9, 0))
-        elif reminder_type == 'time_on_day':
-            reminder_time = datetime.strptime(value, '%H:%M').time()
-            reminder_datetime = datetime.combine(birthday_date, reminder_time)
-        elif reminder_type == 'time_before':
-            days, time_str = value.split(':', 1)
-            reminder_time = datetime.strptime(time_str, '%H:%M').time()
-            target_date = birthday_date - timedelta(days=int(days))
-            reminder_datetime = datetime.combine(target_date, reminder_time)
+        # The offset from parse_reminder is relative to midnight at the start of the birthday
+        reminder_datetime = datetime.combine(birthday_date, time(0, 0)) + timedelta(minutes=reminder['offset'])
         
         # Localize to user's timezone then convert to UTC
         reminder_datetime = tz.localize(reminder_datetime).astimezone(pytz.UTC)
         return reminder_datetime
     
+    def _get_apprise(self, user_id: str) -> List[apprise.Apprise]:
+        """Get the cached Apprise objects for a user's endpoints, building them if needed"""
+        if user_id not in self._apprise_cache:
+            apobjs = []
+            for endpoint in self.get_user_data(user_id)['apprise_endpoints']:
+                apobj = apprise.Apprise()
+                if apobj.add(endpoint):
+                    apobjs.append(apobj)
+            self._apprise_cache[user_id] = apobjs
+        return self._apprise_cache[user_id]
+    
     async def send_notification(self, user_id: str, title: str, message: str) -> int:
-        """Send notification to all configured endpoints"""
+        """Send notification to all configured endpoints concurrently"""
         user_data = self.get_user_data(user_id)
         
         if not user_data['apprise_endpoints']:
             return 0
         
-        apobj = apprise.Apprise()
-        
-        # Add all endpoints
-        for endpoint in user_data['apprise_endpoints']:
-            apobj.add(endpoint)
+        # Apprise notifies synchronously, so run each endpoint in its own thread
+        results = await asyncio.gather(
+            *[asyncio.to_thread(apobj.notify, body=message, title=title)
+              for apobj in self._get_apprise(user_id)],
+            return_exceptions=True
+        )
         
-        # Send notification
+        success_count = 0
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("Notification error for user %s: %s", user_id, result)
+            elif result:
+                success_count += 1
+        return success_count
+    
+    def get_next_reminder_time(self, birthday: Dict, reminder: Dict, tz, now: datetime) -> datetime:
+        """Get the next UTC time after now that a reminder should fire for a birthday"""
+        # Use the birthday as seen in the user's timezone, not the server's
+        next_birthday = self.get_next_birthday_date(birthday, now.astimezone(tz).date())
+        reminder_time = self.calculate_reminder_time(next_birthday, reminder, tz)
+        
+        # Reminders ahead of the birthday may already have passed for this year's date,
+        # and offsets longer than a year can need more than one year's step
+        while reminder_time <= now:
+            next_birthday = next_birthday.replace(year=next_birthday.year + 1)
+            reminder_time = self.calculate_reminder_time(next_birthday, reminder, tz)
+        
+        return reminder_time
+    
+    def find_reminder(self, user_data: Dict, reminder_id: int) -> Optional[Dict]:
+        """Get a user's reminder by its database id"""
+        for reminder in user_data['reminders']:
+            if reminder['id'] == reminder_id:
+                return reminder
+        return None
+    
+    def schedule_reminder(self, user_id: str, name: str, reminder_id: int, tz=None, now: Optional[datetime] = None):
+        """Schedule a single reminder for a birthday at its exact fire time"""
         try:
-            success = apobj.notify(body=message, title=title)
-            return len(user_data['apprise_endpoints']) if success else 0
+            user_data = self.get_user_data(user_id)
+            birthday = user_data['birthdays'].get(name)
+            reminder = self.find_reminder(user_data, reminder_id)
+            if birthday is None or reminder is None:
+                return  # Removed since this reminder was last scheduled
+            
+            if tz is None:
+                tz = _tz(user_data.get('timezone', 'UTC'))
+            if now is None:
+                now = datetime.now(pytz.UTC)
+            run_date = self.get_next_reminder_time(birthday, reminder, tz, now)
         except Exception as e:
-            logger.error(f"Notification error for user {user_id}: {str(e)}")
-            return 0
+            logger.error("Error scheduling reminder for %s: %s", name, e)
+            return
+        
+        job_id = f"{user_id}:{name}:{reminder_id}"
+        self.scheduler.add_job(
+            self.send_reminder,
+            'date',
+            run_date=run_date,
+            args=[user_id, name, reminder_id],
+            id=job_id,
+            replace_existing=True
+        )
+        self._user_jobs.setdefault(user_id, set()).add(job_id)
+        logger.debug("Scheduled reminder %s for %s", job_id, run_date)
     
-    async def check_birthdays(self):
-        """Check for upcoming birthdays and send reminders"""
-        logger.info("Checking birthdays...")
-        current_time = datetime.now(pytz.UTC)
+    def schedule_user_reminders(self, user_id: str):
+        """(Re)schedule all reminders for every birthday of a user"""
+        # Drop existing jobs first so removed birthdays/reminders don't linger
+        for job_id in self._user_jobs.pop(user_id, ()):
+            try:
+                self.scheduler.remove_job(job_id)
+            except JobLookupError:
+                pass  # Already fired and not rescheduled
         
-        # Clean up old reminder keys periodically (every hour)
-        if not hasattr(self, '_last_cleanup') or (current_time - self._last_cleanup).total_seconds() > 3600:
-            self.cleanup_old_reminder_keys()
-            self._last_cleanup = current_time
+        user_data = self.get_user_data(user_id)
+        if not user_data['birthdays'] or not user_data['reminders']:
+            return
         
-        for user_id, user_data in self.users_data.items():
-            if not user_data['birthdays'] or not user_data['reminders']:
-                continue
+        # Resolve the timezone and current time once for all of the user's reminders
+        tz = _tz(user_data.get('timezone', 'UTC'))
+        now = datetime.now(pytz.UTC)
+        for name in user_data['birthdays']:
+            for reminder in user_data['reminders']:
+                self.schedule_reminder(user_id, name, reminder['id'], tz, now)
+    
+    async def send_reminder(self, user_id: str, name: str, reminder_id: int):
+        """Send a scheduled birthday reminder and schedule the next one"""
+        user_data = self.get_user_data(user_id)
+        birthday = user_data['birthdays'].get(name)
+        reminder = self.find_reminder(user_data, reminder_id)
+        if birthday is None or reminder is None:
+            return
+        
+        try:
+            title = f"🎂 Birthday Reminder: {name}"
+            message = f"Don't forget! {name}'s birthday is coming up on {_format_birthday(birthday)}!"
             
-            timezone_str = user_data.get('timezone', 'UTC')
+            if reminder['type'] == 'time_on_day':
+                message = f"🎉 It's {name}'s birthday today! 🎉"
             
-            for name, birthday_str in user_data['birthdays'].items():
-                next_birthday = self.get_next_birthday_date(birthday_str)
-                
-                for reminder in user_data['reminders']:
-                    try:
-                        reminder_time = self.calculate_reminder_time(
-                            next_birthday, reminder, timezone_str
-                        )
-                        
-                        # Create unique key for this reminder
-                        reminder_key = self.create_reminder_key(
-                            user_id, name, birthday_str, reminder, reminder_time
-                        )
-                        
-                        # Check if it's time to send reminder (within 1 minute window)
-                        time_diff = abs((current_time - reminder_time).total_seconds())
-                        
-                        if time_diff <= 60 and reminder_key not in self.sent_reminders:
-                            # Mark as sent before sending to prevent race conditions
-                            self.sent_reminders.add(reminder_key)
-                            
-                            age = datetime.now().year - 2000  # Approximate age calculation
-                            title = f"🎂 Birthday Reminder: {name}"
-                            message = f"Don't forget! {name}'s birthday is coming up on {birthday_str}!"
-                            
-                            if reminder['type'] == 'time_on_day':
-                                message = f"🎉 It's {name}'s birthday today! 🎉"
-                            
-                            await self.send_notification(user_id, title, message)
-                            logger.info(f"Sent reminder for {name} to user {user_id}")
-                            
-                    except Exception as e:
-                        logger.error(f"Error processing reminder for {name}: {str(e)}")
-    
-    async def run_birthday_checker(self):
-        """Run periodic birthday checker"""
-        while True:
-            try:
-                await self.check_birthdays()
-                await asyncio.sleep(60)  # Check every minute
-            except Exception as e:
-                logger.error(f"Error in birthday checker: {str(e)}")
-                await asyncio.sleep(60)
+            await self.send_notification(user_id, title, message)
+            logger.info("Sent reminder for %s to user %s", name, user_id)
+        except Exception as e:
+            logger.error("Error processing reminder for %s: %s", name, e)
+        
+        # Reschedule for next year's birthday; schedule_reminder looks the birthday and
+        # reminder up again and skips them if they were removed while sending
+        self.schedule_reminder(user_id, name, reminder_id)
     
     async def post_init(self, application):
-        """Initialize background tasks after the application starts"""
-        asyncio.create_task(self.run_birthday_checker())
+        """Load user data and start the reminder scheduler after the application starts"""
+        await self.init_db()
+        await self.load_data()
+        
+        # Never drop a late job: it would not get rescheduled for next year
+        self.scheduler = AsyncIOScheduler(
+            timezone=pytz.UTC,
+            job_defaults={'misfire_grace_time': None}
+        )
+        self.scheduler.start()
+        
+        for user_id in self.users_data:
+            self.schedule_user_reminders(user_id)
+    
+    async def post_shutdown(self, application):
+        """Stop background work and close the database"""
+        self.scheduler.shutdown(wait=False)
+        _http_adapter.close()
+        await self.db.close()
     
     def run(self):
         """Run the bot"""
-        # Set up post-init callback to start background tasks
+        # Set up callbacks to start and stop the database and scheduler
         self.application.post_init = self.post_init
-        
-        # Run the bot
-        self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+        self.application.post_shutdown = self.post_shutdown
+        
+        # Run the bot with long polling; only messages and callback queries are handled
+        self.application.run_polling(
+            allowed_updates=[Update.MESSAGE, Update.CALLBACK_QUERY],
+            poll_interval=0.0,
+            timeout=30,
+            bootstrap_retries=-1
+        )
 
 # Configuration
 BOT_TOKEN = os.getenv("BOT_TOKEN")